@@ -0,0 +1,191 @@
+"""
+Microbenchmarks for the per-play parsing and payload hot paths of the importer
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from xml.etree import ElementTree
+
+import importador
+
+BENCHMARK_USER = 'benchmark'
+DEFAULT_SIZES = [100, 1000, 10000]
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+DEFAULT_THRESHOLD = 0.2
+FIXTURE_DIR = os.path.join('benchmarks', 'fixtures')
+# Measured values compared to the baseline, with the unit they are reported in
+METRICS = [('ns_per_item', 'ns/item'), ('bytes_per_item', 'B/item')]
+COLORS = ['Azul', 'Vermelho', 'Verde', 'Amarelo', 'Preto', 'Branco', '']
+
+def generate_plays_xml(count, seed=0):
+    """Generates a BGG plays response with the given number of plays, in the BGG XML format"""
+    rand = random.Random(seed)
+    root = ElementTree.Element('plays', username=BENCHMARK_USER, total=str(count), page='1')
+    for play_id in range(1, count + 1):
+        play = ElementTree.SubElement(root, 'play', {
+            'id': str(play_id),
+            'date': f'20{rand.randint(10, 23)}-{rand.randint(1, 12):02d}-{rand.randint(1, 28):02d}',
+            'quantity': str(rand.choice([1, 1, 1, 2, 5])),
+            'length': str(rand.choice([0, 15, 30, 45, 60, 90, 120, 180])),
+            'incomplete': '0',
+            'nowinstats': '0',
+            'location': rand.choice(['', 'Casa', 'Clube', 'Loja']),
+        })
+        game_id = rand.randint(1, 500)
+        ElementTree.SubElement(play, 'item', name=f'Jogo {game_id}', objecttype='thing',
+                               objectid=str(game_id))
+        if rand.random() < 0.3:
+            ElementTree.SubElement(play, 'comments').text = f'Partida {play_id}'
+        players = ElementTree.SubElement(play, 'players')
+        player_count = rand.randint(1, 6)
+        for position in range(1, player_count + 1):
+            username = BENCHMARK_USER if position == 1 else rand.choice(['', f'amigo{position}'])
+            ElementTree.SubElement(players, 'player', {
+                'username': username,
+                'userid': '0',
+                'name': f'Jogador {position}',
+                'startposition': str(rand.randint(1, player_count)),
+                'color': rand.choice(COLORS),
+                'score': str(rand.randint(0, 150)),
+                'new': rand.choice(['0', '0', '1']),
+                'rating': '0',
+                'win': rand.choice(['0', '1']),
+            })
+    return ElementTree.tostring(root)
+
+def load_fixture(count):
+    """Loads the plays fixture for a size, generating and saving it if needed"""
+    path = os.path.join(FIXTURE_DIR, f'plays_{count}.xml')
+    if not os.path.exists(path):
+        os.makedirs(FIXTURE_DIR, exist_ok=True)
+        with open(path, 'wb') as fixture_file:
+            fixture_file.write(generate_plays_xml(count))
+    with open(path, 'rb') as fixture_file:
+        return fixture_file.read()
+
+def load_play_elements(content):
+    """Parses the play elements from a recorded plays XML, filling the year published cache so
+    that no request is made to BGG while benchmarking"""
+    play_elements = ElementTree.fromstring(content).findall('play')
+    for play in play_elements:
+        game_id = play.find('item').get('objectid')
+        importador.BGG_GAME_TO_PUBLISHED_YEAR.setdefault(game_id, '2000')
+    return play_elements
+
+def get_benchmarks(play_elements):
+    """Returns the benchmarked functions, each one processing every item of the fixture"""
+    plays = [importador.parse_play(play, BENCHMARK_USER) for play in play_elements]
+    players_per_play = [importador.get_players_from_play(play) for play in play_elements]
+    all_players = [player for play in plays for player in play.players]
+    play_groups = [importador.PlayGroup(play=play, quantity=play.quantity, play_ids=[play.id])
+                   for play in plays]
+    ludopedia_game = {'id_jogo': 1}
+    user_map = {f'amigo{position}': str(position) for position in range(1, 7)}
+
+    return {
+        'parse_play': (len(play_elements), lambda: [
+            importador.parse_play(play, BENCHMARK_USER) for play in play_elements
+        ]),
+        'get_players_from_play': (len(play_elements), lambda: [
+            importador.get_players_from_play(play) for play in play_elements
+        ]),
+        'sort_players': (len(players_per_play), lambda: [
+            importador.sort_players(players, BENCHMARK_USER) for players in players_per_play
+        ]),
+        'get_observacao_jogador': (len(all_players), lambda: [
+            importador.get_observacao_jogador(player) for player in all_players
+        ]),
+        'build_play_payload': (len(play_groups), lambda: [
+            importador.build_play_payload(play_group, ludopedia_game, BENCHMARK_USER, user_map)
+            for play_group in play_groups
+        ]),
+    }
+
+def measure(function, items, repeat):
+    """Returns the best time per item (in ns) and the allocated bytes per item of a function"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    (_, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'ns_per_item': best * 1e9 / items, 'bytes_per_item': peak / items}
+
+def run_benchmarks(fixtures, repeat):
+    """Runs every benchmark for every fixture and returns the results keyed by name"""
+    results = dict()
+    for (fixture_name, content) in fixtures:
+        play_elements = load_play_elements(content)
+        for (name, (items, function)) in get_benchmarks(play_elements).items():
+            result = measure(function, items, repeat)
+            results[f'{name}[{fixture_name}]'] = result
+            print(f'{name:<24}{fixture_name:>12}{result["ns_per_item"]:>14.0f} ns/item'
+                  f'{result["bytes_per_item"]:>12.0f} B/item')
+    return results
+
+def compare_to_baseline(results, baseline, threshold):
+    """Returns a description of every result slower or allocating more than the baseline by
+    more than threshold"""
+    regressions = []
+    for (key, result) in results.items():
+        if key not in baseline:
+            continue
+        for (metric, unit) in METRICS:
+            if not baseline[key].get(metric):
+                continue
+            ratio = result[metric] / baseline[key][metric]
+            if ratio > 1 + threshold:
+                regressions.append(f'{key}: {baseline[key][metric]:.0f} ->'
+                                   f' {result[metric]:.0f} {unit} ({ratio:.2f}x)')
+    return regressions
+
+def main():
+    """Runs the benchmarks and compares them to the stored baseline"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='number of plays of each generated fixture (ex: 100 1000 100000)')
+    parser.add_argument('--fixture', action='append', default=[],
+                        help='recorded BGG plays XML to benchmark, can be repeated')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='time or allocation ratio over the baseline to flag as a regression')
+    args = parser.parse_args()
+
+    fixtures = [(str(size), load_fixture(size)) for size in args.sizes]
+    for path in args.fixture:
+        with open(path, 'rb') as fixture_file:
+            fixtures.append((os.path.basename(path), fixture_file.read()))
+
+    results = run_benchmarks(fixtures, args.repeat)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+        print(f'Baseline salva em {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f'Nenhuma baseline encontrada em {args.baseline}, use --save-baseline')
+        return 0
+
+    with open(args.baseline) as baseline_file:
+        regressions = compare_to_baseline(results, json.load(baseline_file), args.threshold)
+    for regression in regressions:
+        print(f'REGRESSÃO {regression}')
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,25 +2,37 @@
 Script to import data from BoardGameGeek into Ludopedia
 """
 
+import json
 import os
 import re
+import sqlite3
 import sys
 import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from configparser import ConfigParser
+from contextlib import contextmanager
 from datetime import datetime
 from enum import Enum
-from itertools import chain
+from functools import partial
+from itertools import chain, cycle
 from math import ceil
+from queue import Queue
+from threading import Lock, current_thread, get_ident, local
 from typing import List, NamedTuple
+from urllib.parse import urljoin, urlparse
 from xml.etree import ElementTree
 
 import requests
 from PySide6.QtCore import (QAbstractItemModel, QCoreApplication, QDate, QModelIndex, QObject,
-                            QThread, QTime, Qt, Signal)
+                            QRunnable, QThreadPool, QTime, Qt, Signal)
 from PySide6.QtGui import QIcon, QTextCursor
-from PySide6.QtWidgets import (QApplication, QButtonGroup, QDateTimeEdit, QDialog, QGridLayout,
-                               QGroupBox, QInputDialog, QLabel, QLineEdit, QListView, QListWidget,
-                               QTableView, QTextEdit, QPushButton, QRadioButton, QWidget)
+from PySide6.QtWidgets import (QApplication, QButtonGroup, QComboBox, QDateTimeEdit, QDialog,
+                               QDialogButtonBox, QGridLayout, QGroupBox, QInputDialog, QLabel,
+                               QLineEdit, QListView, QListWidget, QMessageBox, QProgressBar,
+                               QScrollArea, QTableView, QTextEdit, QPushButton, QRadioButton,
+                               QWidget)
 
 ICON_PATH = 'res/bgg_ludo.png'
 
@@ -31,6 +43,9 @@ BGG_PLAYS_API = f'{BGG_API}plays'
 BGG_THING_API = f'{BGG_API}thing'
 BGG_USER_API = f'{BGG_API}user'
 BGG_PLAYS_PER_PAGE = int(100)
+BGG_MIN_REQUEST_INTERVAL = 0.5
+# BGG answers 202 while a request is queued, so it gets more retries than other hosts
+BGG_MAX_RETRIES = 10
 
 # Ludopedia constants
 LUDOPEDIA_URL = 'https://ludopedia.com.br/'
@@ -40,9 +55,37 @@ LUDOPEDIA_LOGIN_URL = f'{LUDOPEDIA_URL}login'
 LUDOPEDIA_PLAYS_URL = f'{LUDOPEDIA_URL}partidas?id_usuario='
 LUDOPEDIA_SEARCH_URL = f'{LUDOPEDIA_URL}classes/ajax/aj_search.php'
 LUDOPEDIA_USER_URL = f'{LUDOPEDIA_URL}usuario/'
-LUDOPEDIA_USER_ID_REGEX = re.escape(LUDOPEDIA_PLAYS_URL) + r'(\d+)'
+LUDOPEDIA_USER_ID_REGEX = re.compile(re.escape(LUDOPEDIA_PLAYS_URL).encode() + rb'(\d+)')
 LUDOPEDIA_VIEW_PLAY_URL = f'{LUDOPEDIA_URL}partida?id_partida='
-LUDOPEDIA_VIEW_PLAY_REGEX = re.escape(LUDOPEDIA_VIEW_PLAY_URL) + r'(\d+)'
+LUDOPEDIA_VIEW_PLAY_REGEX = re.compile(re.escape(LUDOPEDIA_VIEW_PLAY_URL).encode() + rb'(\d+)')
+# Matches either the wrong credentials message or the logged user id, whichever comes first
+LUDOPEDIA_LOGIN_REGEX = re.compile(rb'senha incorretos|id_usuario=(\d+)')
+LUDOPEDIA_MIN_REQUEST_INTERVAL = 0.1
+LUDOPEDIA_SESSION_FILE = 'sessao_ludopedia.json'
+# Number of authenticated sessions used to post to Ludopedia in parallel
+LUDOPEDIA_SESSION_POOL_SIZE = 1
+# Seconds to wait for a search before firing a second identical one (None disables it)
+LUDOPEDIA_SEARCH_HEDGE_DELAY = 3.0
+LUDOPEDIA_SEARCH_ROWS = 20
+# Local index of every game received in Ludopedia searches, looked up before searching again
+LUDOPEDIA_CATALOG_FILE = 'catalogo_ludopedia.sqlite'
+# Search result pages fetched for each uncatalogued game before an import (0 disables warming)
+CATALOG_WARM_PAGES = 0
+
+# Network
+HTTP_TIMEOUT = (5, 30)  # (connect, read) in seconds
+HTTP_MAX_RETRIES = 3
+HTTP_RETRY_DELAY = 2
+# Responses are read in chunks of this size, only until the expected data is found
+STREAM_CHUNK_SIZE = 4096
+STREAM_OVERLAP = 256
+
+# Jobs
+MAX_CONCURRENT_JOBS = 3
+RUN_DEADLINE = 4 * 60 * 60  # seconds an import may run before being stopped
+PROGRESS_INTERVAL = 0.25  # minimum seconds between progress updates of a job
+COLLECTION_IMPORT = 'Coleção'
+PLAYS_IMPORT = 'Partidas'
 
 # Formatting
 DATE_FORMAT = 'dd/MM/yyyy'
@@ -50,6 +93,15 @@ DEBUG_HTML = '<font color="darkseagreen">'
 ERROR_HTML = '<font color="orangered">'
 
 ENABLE_DEBUG = False
+# Writes a Chrome/Perfetto trace (chrome://tracing or ui.perfetto.dev) of each import run
+ENABLE_TRACE = False
+TRACE_FILE = 'trace_importador.json'
+# Records every BGG/Ludopedia read into the HTTP archive (ARCHIVE_RECORD) or serves them from it
+# without network access (ARCHIVE_REPLAY), in which case nothing is posted to Ludopedia
+ARCHIVE_RECORD = 'record'
+ARCHIVE_REPLAY = 'replay'
+HTTP_ARCHIVE_MODE = None
+HTTP_ARCHIVE_FILE = 'arquivo_http.sqlite'
 
 class MessageType(Enum):
     """Enum for message logging"""
@@ -77,10 +129,487 @@ class Play(NamedTuple):
     year_published: int
     comments: str
     players: List[Player]
+    quantity: int
+
+class Progress(NamedTuple):
+    """Represents the progress of the current stage of a worker job"""
+    job: str
+    stage: str
+    done: int
+    total: int
+    rate: float
+    eta: float
+
+class PlayGroup(NamedTuple):
+    """Represents identical BGG plays that can be posted as a single Ludopedia play"""
+    play: Play
+    quantity: int
+    play_ids: List[int]
 
 class InputError(Exception):
     """Exception to be used if there is an input error"""
 
+class JobCancelled(Exception):
+    """Exception raised by a worker that was cancelled, to stop it between items"""
+
+class DeadlineExceeded(JobCancelled):
+    """Exception raised by a worker whose import ran past its deadline"""
+
+class LatencyStats:
+    """Collects the time taken by each item of a stage to report its percentiles"""
+
+    def __init__(self):
+        self.durations = []
+
+    def add(self, duration):
+        """Records the duration of an item"""
+        self.durations.append(duration)
+
+    def percentile(self, percent):
+        """Returns the given percentile (nearest-rank) of the recorded durations"""
+        durations = sorted(self.durations)
+        return durations[max(ceil(percent / 100 * len(durations)) - 1, 0)]
+
+    def summary(self):
+        """Formats the recorded durations for logging"""
+        return (f'{len(self.durations)} itens, p50 {self.percentile(50):.2f}s,'
+                f' p99 {self.percentile(99):.2f}s, máx {max(self.durations):.2f}s')
+
+class Tracer:
+    """Collects timed spans from all threads to be written as a Chrome trace file"""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.events = []
+        self.thread_names = dict()
+        self.jobs = local()
+        self.lock = Lock()
+
+    @contextmanager
+    def span(self, name, category, **args):
+        """Records the time spent inside the block as a span, if tracing is enabled"""
+        if not ENABLE_TRACE:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            thread_id = get_ident()
+            # Pool threads are reused by several jobs, so each span records its own job
+            job = getattr(self.jobs, 'name', None)
+            if job:
+                args['job'] = job
+            event = {'name': name, 'cat': category, 'ph': 'X', 'pid': os.getpid(),
+                     'tid': thread_id, 'ts': (start - self.origin) * 1e6,
+                     'dur': (end - start) * 1e6, 'args': args}
+            with self.lock:
+                self.events.append(event)
+                self.thread_names.setdefault(thread_id, current_thread().name)
+
+    def set_job(self, name):
+        """Sets the job whose spans are recorded by the current thread"""
+        self.jobs.name = name
+
+    def bind_job(self, function):
+        """Wraps a function to record its spans under the job of the current thread, wherever
+        it runs"""
+        job = getattr(self.jobs, 'name', None)
+        def run_as_job(*args, **kwargs):
+            self.set_job(job)
+            return function(*args, **kwargs)
+        return run_as_job
+
+    def clear(self):
+        """Discards the spans recorded so far, to start the trace of a new run"""
+        with self.lock:
+            self.events = []
+
+    def write(self, path):
+        """Writes the spans recorded since the last clear in the Chrome trace format"""
+        with self.lock:
+            metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': thread_id,
+                         'args': {'name': thread_name}}
+                        for thread_id, thread_name in self.thread_names.items()]
+            trace = {'traceEvents': metadata + self.events, 'displayTimeUnit': 'ms'}
+        with open(path, 'w') as trace_file:
+            json.dump(trace, trace_file)
+
+class BGGUnavailable(Exception):
+    """Exception raised when BGG keeps a request queued or throttled after all retries"""
+
+class ArchiveMiss(Exception):
+    """Exception raised when replaying a request that is not in the HTTP archive"""
+
+class HttpArchive:
+    """Compact archive of HTTP responses indexed by request URL, used to record and replay runs"""
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = None
+        self.lock = Lock()
+
+    def get_connection(self):
+        """Opens the archive on first use, creating it if needed"""
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute('CREATE TABLE IF NOT EXISTS responses (request TEXT PRIMARY KEY,'
+                                    ' status INTEGER, url TEXT, encoding TEXT, headers TEXT,'
+                                    ' body BLOB)')
+        return self.connection
+
+    def save(self, request, response):
+        """Stores the compressed response of a request, replacing any previous one"""
+        headers = {name: value for name, value in response.headers.items()
+                   if name.lower() in ('content-type', 'location')}
+        with self.lock:
+            connection = self.get_connection()
+            connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                               (request, response.status_code, response.url, response.encoding,
+                                json.dumps(headers), zlib.compress(response.content)))
+            connection.commit()
+
+    def load(self, request):
+        """Rebuilds the stored response of a request"""
+        with self.lock:
+            row = self.get_connection().execute(
+                'SELECT status, url, encoding, headers, body FROM responses WHERE request = ?',
+                (request,)
+            ).fetchone()
+        if row is None:
+            raise ArchiveMiss(f'Requisição não encontrada no arquivo HTTP: {request}')
+
+        (status, url, encoding, headers, body) = row
+        response = requests.Response()
+        response.status_code = status
+        response.url = url
+        response.encoding = encoding
+        response.headers.update(json.loads(headers))
+        response._content = zlib.decompress(body)
+        # There is no connection behind the rebuilt response, its body is already in memory
+        response._content_consumed = True
+        return response
+
+class LudopediaCatalog:
+    """Local index of the Ludopedia games received in searches, with full-text lookup by name"""
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = None
+        self.full_text = True
+        self.lock = Lock()
+
+    def get_connection(self):
+        """Opens the catalog on first use, creating it if needed"""
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            try:
+                self.connection.execute('CREATE VIRTUAL TABLE IF NOT EXISTS games USING fts5('
+                                        'nm_jogo, ano_publicacao UNINDEXED, data UNINDEXED)')
+            except sqlite3.OperationalError:
+                # SQLite built without FTS5, fall back to a plain table searched with LIKE
+                self.full_text = False
+                self.connection.execute('CREATE TABLE IF NOT EXISTS games (rowid INTEGER PRIMARY'
+                                        ' KEY, nm_jogo TEXT, ano_publicacao TEXT, data TEXT)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS searches (query TEXT PRIMARY KEY,'
+                                    ' ids TEXT)')
+        return self.connection
+
+    def add(self, items, query=None):
+        """Adds (or updates) games from a Ludopedia search result, remembering which games were
+        returned for the query if one is given"""
+        rows = [(int(item['id_jogo']), item['nm_jogo'], item['ano_publicacao'], json.dumps(item))
+                for item in items]
+        with self.lock:
+            connection = self.get_connection()
+            connection.executemany('INSERT OR REPLACE INTO games (rowid, nm_jogo, ano_publicacao,'
+                                   ' data) VALUES (?, ?, ?, ?)', rows)
+            if query is not None and rows:
+                connection.execute('INSERT OR REPLACE INTO searches VALUES (?, ?)',
+                                   (query.casefold(), json.dumps([row[0] for row in rows])))
+            connection.commit()
+
+    def find_search(self, query):
+        """Returns the games of a previous search for the given query, or None if it was never
+        searched"""
+        with self.lock:
+            connection = self.get_connection()
+            row = connection.execute('SELECT ids FROM searches WHERE query = ?',
+                                     (query.casefold(),)).fetchone()
+            if row is None:
+                return None
+            ids = json.loads(row[0])
+            rows = connection.execute('SELECT rowid, data FROM games WHERE rowid IN'
+                                      f' ({", ".join("?" * len(ids))})', ids).fetchall()
+        games = dict(rows)
+        return [json.loads(games[game_id]) for game_id in ids if game_id in games]
+
+    def find(self, game_name):
+        """Returns the catalogued games whose names contain all words of the given name"""
+        words = re.findall(r'\w+', game_name)
+        if not words:
+            return []
+
+        with self.lock:
+            connection = self.get_connection()
+            if self.full_text:
+                query = ' '.join('"{}"'.format(word.replace('"', '""')) for word in words)
+                rows = connection.execute('SELECT data FROM games WHERE games MATCH ?'
+                                          ' ORDER BY rank', (query,)).fetchall()
+            else:
+                condition = ' AND '.join(['nm_jogo LIKE ?'] * len(words))
+                rows = connection.execute(f'SELECT data FROM games WHERE {condition}',
+                                          [f'%{word}%' for word in words]).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+class RateLimiter:
+    """Spaces out requests to a host, shared by all jobs running concurrently"""
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self.next_request = 0.0
+        self.lock = Lock()
+
+    def wait(self):
+        """Blocks until a new request can be made"""
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_request - now
+            self.next_request = max(now, self.next_request) + self.min_interval
+        if delay > 0:
+            with TRACER.span('rate limit', 'wait'):
+                time.sleep(delay)
+
+class LudopediaSession:
+    """Authenticated Ludopedia session that logs in again if it expires mid-run"""
+
+    def __init__(self, email, password):
+        self.email = email
+        self.password = password
+        self.session = requests.Session()
+        self.user_id = None
+        self.login_lock = Lock()
+
+    def login(self):
+        """Logins into Ludopedia, raising InputError if the credentials are refused"""
+        payload = {'email': self.email, 'pass': self.password}
+        with TRACER.span('POST /login', 'http'):
+            session_request = self.session.post(LUDOPEDIA_LOGIN_URL, data=payload,
+                                                timeout=HTTP_TIMEOUT, stream=True)
+            login_match = search_response(session_request, LUDOPEDIA_LOGIN_REGEX)
+
+        if login_match and not login_match.group(1):
+            raise InputError
+
+        self.user_id = login_match.group(1).decode() if login_match else None
+
+    def is_logged_in(self):
+        """Checks whether the session cookies are still accepted by Ludopedia"""
+        response = self.send('GET', LUDOPEDIA_ADD_PLAY_URL, allow_redirects=False, stream=True)
+        response.close()
+        return not is_login_redirect(response)
+
+    def export_state(self):
+        """Returns the cookies and user id of the session, to be persisted"""
+        cookies = [{'name': cookie.name, 'value': cookie.value, 'domain': cookie.domain,
+                    'path': cookie.path, 'expires': cookie.expires, 'secure': cookie.secure}
+                   for cookie in self.session.cookies]
+        return {'user_id': self.user_id, 'cookies': cookies}
+
+    def import_state(self, state):
+        """Loads the cookies and user id of a persisted session"""
+        self.user_id = state['user_id']
+        for cookie in state['cookies']:
+            self.session.cookies.set(**cookie)
+
+    def send(self, method, url, **kwargs):
+        """Makes a request, retrying GETs a bounded number of times on network failures"""
+        if method == 'GET':
+            return get_with_retries(self.session, url, LUDOPEDIA_RATE_LIMITER, **kwargs)
+        LUDOPEDIA_RATE_LIMITER.wait()
+        with TRACER.span(f'{method} {urlparse(url).path}', 'http'):
+            return self.session.request(method, url, timeout=HTTP_TIMEOUT, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        """Makes a request, logging in again and retrying once if the session expired"""
+        response = self.send(method, url, **kwargs)
+        if is_login_redirect(response):
+            response.close()
+            with self.login_lock:
+                self.login()
+            response = self.send(method, url, **kwargs)
+        return response
+
+    def get(self, url, **kwargs):
+        """Makes a GET request to Ludopedia"""
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """Makes a POST request to Ludopedia"""
+        return self.request('POST', url, **kwargs)
+
+class LudopediaSessionPool:
+    """Pool of authenticated Ludopedia sessions that can be used by several threads at once"""
+
+    def __init__(self, sessions):
+        self.sessions = sessions
+        self.next_session = cycle(sessions)
+        self.next_session_lock = Lock()
+        self.available = Queue()
+        for session in sessions:
+            self.available.put(session)
+
+    @property
+    def size(self):
+        """Number of sessions in the pool"""
+        return len(self.sessions)
+
+    @property
+    def user_id(self):
+        """Ludopedia id of the logged user"""
+        return self.sessions[0].user_id
+
+    @contextmanager
+    def checkout(self):
+        """Borrows a session from the pool, waiting for one to be available"""
+        session = self.available.get()
+        try:
+            yield session
+        finally:
+            self.available.put(session)
+
+    def get(self, url, **kwargs):
+        """Makes a GET request to Ludopedia, sharing the sessions in turns as reads are
+        idempotent"""
+        with self.next_session_lock:
+            session = next(self.next_session)
+        return session.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """Makes a POST request to Ludopedia with any available session"""
+        with self.checkout() as session:
+            return session.post(url, **kwargs)
+
+    def save(self, path):
+        """Persists the cookies of all sessions, so they can be reused by the next run"""
+        state = {'email': self.sessions[0].email,
+                 'sessions': [session.export_state() for session in self.sessions]}
+        with open(path, 'w') as session_file:
+            json.dump(state, session_file)
+        os.chmod(path, 0o600)
+
+def load_ludopedia_sessions(path, email):
+    """Loads the persisted session states of a Ludopedia user, if any"""
+    try:
+        with open(path) as session_file:
+            state = json.load(session_file)
+        if state.get('email') == email:
+            return state['sessions']
+    except (OSError, ValueError, KeyError):
+        pass
+    return []
+
+def get_with_retries(session, url, rate_limiter, max_retries=HTTP_MAX_RETRIES, retry_statuses=(),
+                     **kwargs):
+    """Makes an idempotent GET request, retrying a bounded number of times on network failures
+    or on the given status codes"""
+    for attempt in range(max_retries + 1):
+        rate_limiter.wait()
+        try:
+            with TRACER.span(f'GET {urlparse(url).path}', 'http', attempt=attempt):
+                response = session.get(url, timeout=HTTP_TIMEOUT, **kwargs)
+            if response.status_code not in retry_statuses:
+                return response
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == max_retries:
+                raise
+        if attempt < max_retries:
+            with TRACER.span('retry', 'wait'):
+                time.sleep(HTTP_RETRY_DELAY)
+    return response
+
+def hedged_get(session, url, hedge_delay, **kwargs):
+    """Makes a GET request and, if it takes longer than hedge_delay, an identical second one,
+    returning whichever answers first"""
+    get = TRACER.bind_job(session.get)
+    first_request = HEDGE_EXECUTOR.submit(get, url, **kwargs)
+    try:
+        return first_request.result(timeout=hedge_delay)
+    except FutureTimeoutError:
+        pass
+    second_request = HEDGE_EXECUTOR.submit(get, url, **kwargs)
+    with TRACER.span('hedge', 'http', url=url):
+        (done, pending) = wait([first_request, second_request], return_when=FIRST_COMPLETED)
+    finished_request = done.pop()
+    if finished_request.exception() and pending:
+        return pending.pop().result()
+    return finished_request.result()
+
+def archived_get(fetch, url, params=None):
+    """Gets a response through fetch, recording it in or replaying it from the HTTP archive
+    according to HTTP_ARCHIVE_MODE"""
+    if HTTP_ARCHIVE_MODE is None:
+        return fetch()
+
+    request = requests.Request('GET', url, params=params).prepare().url
+    if HTTP_ARCHIVE_MODE == ARCHIVE_REPLAY:
+        return HTTP_ARCHIVE.load(request)
+
+    response = fetch()
+    HTTP_ARCHIVE.save(request, response)
+    return response
+
+def is_replaying():
+    """Whether responses come from the HTTP archive, in which case nothing must be posted"""
+    return HTTP_ARCHIVE_MODE == ARCHIVE_REPLAY
+
+def search_response(response, regex, session=None):
+    """Searches a response for a bytes regex, looking at its redirect location first and then
+    reading the body only until a match is found. If a session is given, redirects that don't
+    match are followed."""
+    location = response.headers.get('Location')
+    if location:
+        location = urljoin(response.url, location)
+        match = regex.search(location.encode())
+        if match:
+            response.close()
+            return match
+
+    buffer = b''
+    match = None
+    try:
+        for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+            # Keep the end of the previous chunk, so that matches split between chunks are found
+            buffer = buffer[-STREAM_OVERLAP:] + chunk
+            match = regex.search(buffer)
+            # A match reaching the end of the buffer may continue on the next chunk (ex: an id
+            # cut in half), so it is only accepted once more data or the end of the body arrives
+            if match and match.end() < len(buffer):
+                return match
+    finally:
+        response.close()
+    if match:
+        return match
+
+    if location and session is not None and response.is_redirect:
+        return search_response(session.get(location, stream=True), regex, session)
+    return None
+
+def is_login_redirect(response):
+    """Checks whether a Ludopedia response was redirected to the login page"""
+    target = urljoin(response.url, response.headers.get('Location', ''))
+    return urlparse(target).path == urlparse(LUDOPEDIA_LOGIN_URL).path
+
+TRACER = Tracer()
+HTTP_ARCHIVE = HttpArchive(HTTP_ARCHIVE_FILE)
+LUDOPEDIA_CATALOG = LudopediaCatalog(LUDOPEDIA_CATALOG_FILE)
+HEDGE_EXECUTOR = ThreadPoolExecutor(max_workers=2 * MAX_CONCURRENT_JOBS)
+BGG_SESSION = requests.Session()
+BGG_RATE_LIMITER = RateLimiter(BGG_MIN_REQUEST_INTERVAL)
+LUDOPEDIA_RATE_LIMITER = RateLimiter(LUDOPEDIA_MIN_REQUEST_INTERVAL)
+
 def create_date_picker(text, parent):
     """Creates a label with the given text and an accompanying date picker"""
     date_edit = QDateTimeEdit(QDate.currentDate(), parent)
@@ -92,6 +621,14 @@ def create_date_picker(text, parent):
     date_edit_label.setBuddy(date_edit)
     return (date_edit, date_edit_label)
 
+def format_progress(progress):
+    """Format the progress of a job to be shown to the user"""
+    text = (f'{progress.job} - {progress.stage}: {progress.done}/{progress.total}'
+            f' ({progress.rate:.1f} itens/s')
+    if progress.eta is not None:
+        text += f', faltam {int(progress.eta // 60)}:{int(progress.eta % 60):02d}'
+    return text + ')'
+
 def format_qdate(date):
     """Format a given QDate according to a standard format"""
     return date.toString(DATE_FORMAT)
@@ -99,12 +636,14 @@ def format_qdate(date):
 class Importador(QWidget):
     """GUI class for the BGG -> Ludopedia importer"""
     enable_editables = Signal(bool)
-    alternative_chosen = Signal(object)
+    resolutions_chosen = Signal(object)
 
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.thread = QThread()
-        self.worker = None
+        self.scheduler = JobScheduler(MAX_CONCURRENT_JOBS, self)
+        self.scheduler.idle.connect(self.write_trace)
+        self.running_imports = set()
+        self.import_deadlines = dict()
         grid_layout = QGridLayout(self)
         login_group_box = self.create_login_group()
         data_group_box = self.create_data_group()
@@ -112,15 +651,27 @@ class Importador(QWidget):
         self.enable_editables.connect(data_group_box.setEnabled)
         self.import_button = QPushButton('Importar', self)
         self.import_button.setEnabled(False)
-        self.enable_editables.connect(self.import_button.setEnabled)
+        self.enable_editables.connect(self.enable_import)
         self.import_button.clicked.connect(self.enable_editables)
         self.import_button.clicked.connect(self.load_data)
         self.bgg_user_line_edit.textChanged.connect(self.enable_import)
         self.ludo_mail_line_edit.textChanged.connect(self.enable_import)
         self.ludo_pass_line_edit.textChanged.connect(self.enable_import)
+        self.partidas_radio_button.toggled.connect(self.enable_import)
         grid_layout.addWidget(login_group_box, 1, 1, 1, 2)
         grid_layout.addWidget(data_group_box, 2, 1, 1, 2)
+        self.cancel_button = QPushButton('Cancelar', self)
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_import)
+        self.partidas_radio_button.toggled.connect(self.update_cancel_button)
+        self.progress_bar = QProgressBar(self)
+        self.progress_bar.setVisible(False)
+        self.progress_label = QLabel(self)
+        self.job_progress = dict()
+        grid_layout.addWidget(self.cancel_button, 8, 1)
         grid_layout.addWidget(self.import_button, 8, 2)
+        grid_layout.addWidget(self.progress_bar, 6, 1, 1, 2)
+        grid_layout.addWidget(self.progress_label, 7, 1, 1, 2)
         self.log_widget = QTextEdit(self)
         self.log_widget.setReadOnly(True)
         grid_layout.addWidget(self.log_widget, 9, 1, 30, 2)
@@ -179,11 +730,16 @@ class Importador(QWidget):
         group_box.setLayout(grid_layout)
         return group_box
 
+    def get_selected_import(self):
+        """Returns which import (collection or plays) is currently selected"""
+        return PLAYS_IMPORT if self.partidas_radio_button.isChecked() else COLLECTION_IMPORT
+
     def enable_import(self):
         """Slot to toggle state of the import button"""
         self.import_button.setDisabled(not self.bgg_user_line_edit.text() or
                                        not self.ludo_mail_line_edit.text() or
-                                       not self.ludo_pass_line_edit.text())
+                                       not self.ludo_pass_line_edit.text() or
+                                       self.get_selected_import() in self.running_imports)
 
     def log_text(self, message_type, text):
         """Logs the given text to the QPlainTextWidget"""
@@ -199,46 +755,115 @@ class Importador(QWidget):
         if ENABLE_DEBUG:
             print(text)
 
-    def disconnect_thread(self):
-        """Disconnect the started signal from the thread"""
-        self.thread.started.disconnect()
-
-    def configure_thread(self, worker):
-        """Does basic thread startup and cleanup configuration"""
-        worker.finished.connect(self.thread.quit)
-        worker.moveToThread(self.thread)
-        self.thread.started.connect(worker.run)
+    def closeEvent(self, event):
+        """Cancels all running jobs when the window is closed (Overriden)"""
+        self.scheduler.cancel_all()
+        super().closeEvent(event)
+
+    def write_trace(self):
+        """Writes the trace of the current import runs, if tracing is enabled"""
+        if ENABLE_TRACE:
+            TRACER.write(TRACE_FILE)
+            self.log_text(MessageType.DEBUG, f'Trace salvo em {TRACE_FILE}')
+
+    def update_cancel_button(self):
+        """Slot to allow cancelling only while the selected import is running"""
+        self.cancel_button.setEnabled(self.get_selected_import() in self.running_imports)
+
+    def cancel_import(self):
+        """Slot to cancel the jobs of the selected import, which stop before their next item"""
+        import_name = self.get_selected_import()
+        self.log_text(MessageType.GENERIC, f'Cancelando importação: {import_name}...')
+        self.scheduler.cancel(import_name)
+
+    def watch_job(self, worker):
+        """Shows the messages and progress of a worker"""
         worker.message.connect(self.log_text)
-        worker.finished.connect(self.disconnect_thread)
-        worker.exit_on_error.connect(self.thread.quit)
+        worker.progress.connect(self.update_progress)
+        worker.done.connect(self.clear_progress)
+
+    def update_progress(self, progress):
+        """Slot to show the progress of a job"""
+        self.job_progress[progress.job] = progress
+        self.show_progress()
+
+    def clear_progress(self, worker):
+        """Slot to stop showing the progress of a finished job"""
+        self.job_progress.pop(worker.JOB_NAME, None)
+        self.show_progress()
+
+    def show_progress(self):
+        """Shows the combined progress of all running jobs and the throughput/ETA of each one"""
+        progresses = list(self.job_progress.values())
+        self.progress_bar.setVisible(bool(progresses))
+        self.progress_bar.setMaximum(max(sum(progress.total for progress in progresses), 1))
+        self.progress_bar.setValue(sum(progress.done for progress in progresses))
+        self.progress_label.setText('\n'.join(format_progress(progress)
+                                              for progress in progresses))
+
+    def schedule_job(self, worker, import_name):
+        """Logs the messages of a worker that is part of an import and runs it as a job"""
+        self.watch_job(worker)
         worker.exit_on_error.connect(
-            lambda: self.enable_editables.emit(True)
+            lambda: self.finish_import(import_name)
         )
+        worker.deadline = self.import_deadlines[import_name]
+        self.scheduler.submit(worker, import_name)
+
+    def finish_import(self, import_name):
+        """Marks an import as finished, allowing it to be started again"""
+        self.running_imports.discard(import_name)
+        self.enable_import()
+        self.update_cancel_button()
 
     def load_data(self):
         """Load data from bgg"""
+        import_name = self.get_selected_import()
+        # The scheduler may go idle mid-import (ex: while the play table is shown), so the trace
+        # is only restarted when no import is running
+        if not self.running_imports:
+            TRACER.clear()
         try:
             (session, ludo_user_id) = self.login_ludopedia()
             bgg_user = self.bgg_user_line_edit.text()
+            self.running_imports.add(import_name)
+            self.import_deadlines[import_name] = time.monotonic() + RUN_DEADLINE
+            self.update_cancel_button()
 
-            if self.partidas_radio_button.isChecked():
+            if import_name == PLAYS_IMPORT:
                 current_date = format_qdate(QDate.currentDate())
                 min_date = parse_date(format_qdate(self.min_date_picker.date()), current_date)
                 max_date = parse_date(format_qdate(self.max_date_picker.date()), min_date)
-                self.worker = BGGPlayFetcher(bgg_user, min_date, max_date)
-                self.configure_thread(self.worker)
-                self.worker.finished.connect(
-                    lambda plays: self.post_plays(session, plays, bgg_user, ludo_user_id)
+                play_fetcher = BGGPlayFetcher(bgg_user, min_date, max_date)
+                user_map_resolver = UserMapResolver(bgg_user, ludo_user_id)
+                play_fetcher.exit_on_error.connect(user_map_resolver.cancel)
+                user_map_resolver.exit_on_error.connect(play_fetcher.cancel)
+
+                # Plays and user map are fetched concurrently, post plays once both are done
+                fetched_data = dict()
+                def fetch_finished(key, value):
+                    fetched_data[key] = value
+                    if len(fetched_data) == 2:
+                        self.post_plays(session, fetched_data['plays'], bgg_user,
+                                        fetched_data['user_map'])
+
+                play_fetcher.finished.connect(
+                    lambda plays: fetch_finished('plays', plays)
+                )
+                user_map_resolver.finished.connect(
+                    lambda user_map: fetch_finished('user_map', user_map)
                 )
+                self.schedule_job(play_fetcher, import_name)
+                self.schedule_job(user_map_resolver, import_name)
             else:
-                self.worker = BGGColectionFetcher(bgg_user)
-                self.configure_thread(self.worker)
-                self.worker.finished.connect(
+                collection_fetcher = BGGColectionFetcher(bgg_user)
+                collection_fetcher.finished.connect(
                     lambda bgg_collection: self.import_collection(session, bgg_collection)
                 )
-            self.thread.start()
+                self.schedule_job(collection_fetcher, import_name)
         except InputError:
-            self.enable_editables.emit(True)
+            pass
+        self.enable_editables.emit(True)
 
     def show_play_table(self, plays):
         """Shows a table with all the plays to be imported, allowing user to select some to skip"""
@@ -256,35 +881,35 @@ class Importador(QWidget):
         grid_layout = QGridLayout(table_widget_dialog)
         grid_layout.addWidget(table_widget, 1, 1)
         table_widget_dialog.resize(800, 600)
-        table_widget_dialog.exec_()
+        with TRACER.span('show_play_table', 'dialog'):
+            table_widget_dialog.exec_()
         skipped_plays = tree_model.get_skipped_plays()
         return [play for play in plays if play.id not in skipped_plays]
 
-    def post_plays(self, session, plays, bgg_user, ludo_user_id):
-        """Receives plays from the Play Fetched thread and start the Ludopedia Logger"""
-        user_map = self.get_bgg_to_ludo_users()
-        if bgg_user not in user_map:
-            user_map[bgg_user] = ludo_user_id
-
+    def post_plays(self, session, plays, bgg_user, user_map):
+        """Receives plays from the Play Fetcher job and start the Ludopedia Logger"""
         selected_plays = self.show_play_table(plays)
 
-        self.worker = LudopediaPlayLogger(session, selected_plays, bgg_user, user_map)
-        self.worker.request_search.connect(self.request_search_and_show_alternatives,
-                                           Qt.BlockingQueuedConnection)
-        self.worker.request_alternative.connect(self.request_alternative,
+        play_logger = LudopediaPlayLogger(session, selected_plays, bgg_user, user_map)
+        play_logger.request_resolutions.connect(self.request_resolutions,
                                                 Qt.BlockingQueuedConnection)
-        self.alternative_chosen.connect(self.worker.receive_alternative, Qt.DirectConnection)
-        self.configure_thread(self.worker)
-        self.worker.finished.connect(
-            lambda: self.enable_editables.emit(True)
+        self.resolutions_chosen.connect(play_logger.receive_resolutions, Qt.DirectConnection)
+        play_logger.finished.connect(
+            lambda: self.finish_import(PLAYS_IMPORT)
         )
-        self.thread.start()
+        self.schedule_job(play_logger, PLAYS_IMPORT)
 
     def user_map(self):
-        """Slot to show user map from bgg to ludopedia"""
+        """Slot to resolve and show user map from bgg to ludopedia"""
+        user_map_resolver = UserMapResolver()
+        self.watch_job(user_map_resolver)
+        user_map_resolver.finished.connect(self.show_user_map)
+        self.scheduler.submit(user_map_resolver)
+
+    def show_user_map(self, bgg_to_ludo):
+        """Shows a resolved user map from bgg to ludopedia"""
         user_map_dialog = QDialog(self)
         user_map_dialog.setModal(True)
-        bgg_to_ludo = self.get_bgg_to_ludo_users()
         user_list = [f'{key} -> {value}' for key, value in bgg_to_ludo.items()]
         list_widget = QListWidget(user_map_dialog)
         list_widget.addItems(user_list)
@@ -296,93 +921,132 @@ class Importador(QWidget):
         user_map_dialog.show()
 
     def login_ludopedia(self):
-        """Logins into Ludopedia manually and returns the session and user_id"""
+        """Logins into Ludopedia, reusing saved sessions if possible, and returns the session
+        pool and user_id"""
         self.log_text(MessageType.GENERIC, 'Obtendo dados do Ludopedia')
-        payload = {'email': self.ludo_mail_line_edit.text(),
-                   'pass': self.ludo_pass_line_edit.text()}
-
-        session = requests.Session()
-        session_request = session.post(LUDOPEDIA_LOGIN_URL, data=payload)
-
-        if 'senha incorretos' in session_request.text:
-            self.log_text(MessageType.ERROR,
-                          'Não foi possível logar na Ludopedia com as informações fornecidas')
-            raise InputError
-
-        user_re = re.search(r'id_usuario=(\d+)', session_request.text)
-        user_id = user_re.group(1) if user_re else None
+        email = self.ludo_mail_line_edit.text()
+        password = self.ludo_pass_line_edit.text()
+        if is_replaying():
+            self.log_text(MessageType.GENERIC, 'Reproduzindo arquivo HTTP, nada será enviado'
+                                               ' para a Ludopedia')
+            return (LudopediaSessionPool([LudopediaSession(email, password)]), None)
+
+        saved_states = load_ludopedia_sessions(LUDOPEDIA_SESSION_FILE, email)
+
+        sessions = []
+        for index in range(LUDOPEDIA_SESSION_POOL_SIZE):
+            session = LudopediaSession(email, password)
+            if index < len(saved_states):
+                session.import_state(saved_states[index])
+                if session.is_logged_in():
+                    self.log_text(MessageType.DEBUG, f'Sessão #{index + 1} reaproveitada')
+                    sessions.append(session)
+                    continue
+                session = LudopediaSession(email, password)
+            try:
+                session.login()
+            except InputError:
+                self.log_text(MessageType.ERROR,
+                              'Não foi possível logar na Ludopedia com as informações fornecidas')
+                raise
+            sessions.append(session)
+
+        session_pool = LudopediaSessionPool(sessions)
+        try:
+            session_pool.save(LUDOPEDIA_SESSION_FILE)
+        except OSError:
+            self.log_text(MessageType.DEBUG, 'Não foi possível salvar a sessão da Ludopedia')
 
-        return (session, user_id)
+        return (session_pool, session_pool.user_id)
 
     def import_collection(self, session, collection):
         """Imports a given collection into Ludopedia"""
-        self.worker = LudopediaCollectionLogger(session, collection)
-        self.configure_thread(self.worker)
-        self.worker.finished.connect(
-            lambda: self.enable_editables.emit(True)
+        collection_logger = LudopediaCollectionLogger(session, collection)
+        collection_logger.finished.connect(
+            lambda: self.finish_import(COLLECTION_IMPORT)
         )
-        self.thread.start()
-
-    def show_alternatives_dialog(self, bgg_play, data):
-        """Show alternative games to use as the game to log a play"""
-        alternatives_dialog = QInputDialog(self)
-        alternatives_list = [f'{item["nm_jogo"]} ({item["ano_publicacao"]})' for item in data]
-        alternatives_dialog.setComboBoxItems(alternatives_list)
-        alternatives_dialog.setOption(QInputDialog.UseListViewForComboBoxItems)
-        game_str = f'{bgg_play.game_name} ({bgg_play.year_published})'
-        alternatives_dialog.setLabelText(f'Escolha uma alternativa para o jogo "{game_str}"')
-        if alternatives_dialog.exec_():
-            selected_index = alternatives_list.index(alternatives_dialog.textValue())
-            return data[selected_index]
-        return None
+        self.schedule_job(collection_logger, COLLECTION_IMPORT)
 
-    def request_search_and_show_alternatives(self, session, bgg_play):
-        """Request a new string to use for game search and then show results to be picked"""
-        new_search_dialog = QInputDialog(self)
-        game_str = f'{bgg_play.game_name} ({bgg_play.year_published})'
-        new_search_dialog.setLabelText(f'Jogo "{game_str}" não encontrado\nBuscar por:')
-        new_search_dialog.setInputMode(QInputDialog.TextInput)
-        if new_search_dialog.exec_():
-            data = search_ludopedia_games(session, new_search_dialog.textValue())
-            data = self.show_alternatives_dialog(bgg_play, data)
-            self.alternative_chosen.emit(data)
-
-    def request_alternative(self, bgg_play, data):
-        """Request an alternative from user and emit choice"""
-        alternative = self.show_alternatives_dialog(bgg_play, data)
-        self.alternative_chosen.emit(alternative)
+    def request_resolutions(self, session, pending_games):
+        """Shows all games pending a manual choice at once and emits the user choices"""
+        resolution_dialog = ResolutionDialog(session, pending_games, self)
+        resolutions = dict()
+        with TRACER.span('ResolutionDialog', 'dialog', games=len(pending_games)):
+            accepted = resolution_dialog.exec_()
+        if accepted:
+            resolutions = resolution_dialog.get_resolutions()
+        self.resolutions_chosen.emit(resolutions)
 
-    def get_bgg_to_ludo_users(self):
-        """Reads usuarios.txt file to map a bgg user to its corresponding ludopedia one"""
-        try:
-            parser = ConfigParser()
-            with open("usuarios.txt") as lines:
-                lines = chain(("[top]",), lines)
-                parser.read_file(lines)
-                bgg_to_ludo_user = dict(parser['top'])
-                bgg_to_ludo_user_id = dict()
-                for bgg_user, ludo_user in bgg_to_ludo_user.items():
-                    if is_invalid_bgg_user(bgg_user):
-                        self.log_text(MessageType.ERROR, f'Usuário do BGG "{bgg_user}" inválido'
-                                                         f' no mapa de usuários')
-                        continue
-
-                    if ludo_user.isdigit():
-                        bgg_to_ludo_user_id[bgg_user] = ludo_user
-                        self.log_text(MessageType.DEBUG, f'Usuário do BGG "{bgg_user}" já mapeado'
-                                                         f' ao id ludopedia: {ludo_user}')
-                    else:
-                        ludo_user_id = get_ludo_user_id(ludo_user)
-                        if ludo_user_id:
-                            self.log_text(MessageType.DEBUG, f'{ludo_user_id} para {ludo_user}')
-                            bgg_to_ludo_user_id[bgg_user] = ludo_user_id
-                        else:
-                            self.log_text(MessageType.ERROR, f'Falha ao buscar id de usuario da'
-                                                             f' ludopedia para "{ludo_user}"')
-                return bgg_to_ludo_user_id
-        except FileNotFoundError:
-            self.log_error(MessageType.ERROR, 'Não foi possível encontrar o arquivo "usuarios.txt')
-            return {}
+
+class ResolutionDialog(QDialog):
+    """Dialog to choose, in a single batch, the Ludopedia game for every ambiguous BGG game"""
+    SKIP_TEXT = 'Não importar'
+
+    def __init__(self, session, pending_games, parent=None):
+        super().__init__(parent)
+        self.session = session
+        self.pending_games = pending_games
+        self.alternatives = dict()
+        self.combo_boxes = dict()
+        self.setModal(True)
+        self.setWindowTitle('Jogos pendentes')
+        rows_widget = QWidget(self)
+        rows_layout = QGridLayout(rows_widget)
+        for row, (bgg_play, data) in enumerate(pending_games):
+            game_str = f'{bgg_play.game_name} ({bgg_play.year_published})'
+            combo_box = QComboBox(rows_widget)
+            search_button = QPushButton('Buscar...', rows_widget)
+            search_button.clicked.connect(
+                lambda _=False, play=bgg_play: self.search_alternatives(play)
+            )
+            rows_layout.addWidget(QLabel(game_str, rows_widget), row, 1)
+            rows_layout.addWidget(combo_box, row, 2)
+            rows_layout.addWidget(search_button, row, 3)
+            self.combo_boxes[bgg_play.game_name] = combo_box
+            self.set_alternatives(bgg_play.game_name, data)
+        scroll_area = QScrollArea(self)
+        scroll_area.setWidget(rows_widget)
+        scroll_area.setWidgetResizable(True)
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel, self)
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+        grid_layout = QGridLayout(self)
+        grid_layout.addWidget(QLabel('Escolha uma alternativa para cada jogo:', self), 1, 1)
+        grid_layout.addWidget(scroll_area, 2, 1)
+        grid_layout.addWidget(button_box, 3, 1)
+        self.resize(700, 500)
+
+    def set_alternatives(self, game_name, data):
+        """Fills the combo box of a game with the given Ludopedia alternatives"""
+        self.alternatives[game_name] = data
+        combo_box = self.combo_boxes[game_name]
+        combo_box.clear()
+        combo_box.addItems([f'{item["nm_jogo"]} ({item["ano_publicacao"]})' for item in data])
+        combo_box.addItem(self.SKIP_TEXT)
+
+    def search_alternatives(self, bgg_play):
+        """Request a new string to use for game search and show its results as alternatives"""
+        game_str = f'{bgg_play.game_name} ({bgg_play.year_published})'
+        (text, accepted) = QInputDialog.getText(self, 'Buscar',
+                                                f'Jogo "{game_str}"\nBuscar por:',
+                                                text=bgg_play.game_name)
+        if accepted and text:
+            try:
+                data = search_ludopedia_games(self.session, text)
+            except ArchiveMiss:
+                QMessageBox.warning(self, 'Buscar', f'Busca por "{text}" não encontrada no'
+                                                    ' arquivo HTTP')
+                return
+            self.set_alternatives(bgg_play.game_name, data)
+
+    def get_resolutions(self):
+        """Returns the chosen Ludopedia game (or None if skipped) for each pending BGG game"""
+        resolutions = dict()
+        for game_name, combo_box in self.combo_boxes.items():
+            data = self.alternatives[game_name]
+            selected_index = combo_box.currentIndex()
+            resolutions[game_name] = data[selected_index] if selected_index < len(data) else None
+        return resolutions
 
 
 class PlayTableModel(QAbstractItemModel):
@@ -520,12 +1184,17 @@ def create_gui(icon):
     sys.exit(app.exec_())
 
 def get_from_bgg(api_url, parameters):
-    """Successively attempts to get data from BGG given an API"""
-    response = requests.get(api_url, params=parameters)
-    # Retry if return codes indicate "too many requests"
-    while response.status_code == 202 or response.status_code == 429:
-        time.sleep(2)
-        response = requests.get(api_url, params=parameters)
+    """Successively attempts to get data from BGG given an API, raising BGGUnavailable if it is
+    still queued or throttled after all retries"""
+    # Retry if return codes indicate "queued" or "too many requests"
+    response = archived_get(
+        lambda: get_with_retries(BGG_SESSION, api_url, BGG_RATE_LIMITER, BGG_MAX_RETRIES,
+                                 (202, 429), params=parameters),
+        api_url, parameters
+    )
+    if response.status_code in (202, 429):
+        raise BGGUnavailable(f'BGG não respondeu após {BGG_MAX_RETRIES} tentativas'
+                             f' (status {response.status_code}): {api_url}')
     return response
 
 BGG_GAME_TO_PUBLISHED_YEAR = dict()
@@ -569,14 +1238,15 @@ def get_players_from_play(play):
         ))
     return players
 
+def sort_players(players, username):
+    """Sorts players of a play by start position, with the given user first"""
+    return sorted(players, key=lambda p: (p[1] != username, p[2]))
+
 def parse_play(play, username):
     """Given an BGG xml play, return a tuple with relevant play data"""
     game = play.findall('item')[0]
     comments_element = play.find('comments')
-    players = get_players_from_play(play)
-
-    # sort players, me first
-    players.sort(key=lambda p: (p[1] != username, p[2]))
+    players = sort_players(get_players_from_play(play), username)
 
     return Play(
         id=play.get('id'),
@@ -587,35 +1257,166 @@ def parse_play(play, username):
         year_published=get_yearpublished_from_id(game.get('objectid')),
         comments=comments_element.text if comments_element is not None else None,
         players=players,
+        quantity=int(play.get('quantity') or 1),
     )
 
+def get_play_group_key(play):
+    """Returns the attributes that must match for two plays to be posted together"""
+    return (play.game_name, play.year_published, play.date, play.length, play.location,
+            play.comments, tuple(play.players))
+
+def coalesce_plays(plays):
+    """Groups identical plays, so each group can be posted once with its total quantity"""
+    groups = dict()
+    for play in plays:
+        key = get_play_group_key(play)
+        if key in groups:
+            group = groups[key]
+            groups[key] = group._replace(quantity=group.quantity + play.quantity,
+                                         play_ids=group.play_ids + [play.id])
+        else:
+            groups[key] = PlayGroup(play=play, quantity=play.quantity, play_ids=[play.id])
+    return list(groups.values())
+
 def get_ludo_user_id(ludo_username):
     """Returns the user id (number) for a given username in Ludopedia"""
-    session = requests.Session()
-    result = session.get(f'{LUDOPEDIA_USER_URL}/{ludo_username}')
-    match_id = re.search(LUDOPEDIA_USER_ID_REGEX, result.text)
+    url = f'{LUDOPEDIA_USER_URL}/{ludo_username}'
+    result = archived_get(
+        lambda: get_with_retries(requests.Session(), url, LUDOPEDIA_RATE_LIMITER, stream=True),
+        url
+    )
+    match_id = search_response(result, LUDOPEDIA_USER_ID_REGEX)
     if match_id:
         # Return the user_id
-        return match_id.group(1)
+        return match_id.group(1).decode()
     return None
 
-def search_ludopedia_games(session, game_name):
-    """Search for a given game in Ludopedia"""
-    params = {'tipo': 'jogo', 'count': 'true', 'pagina': 1, 'qt_rows': 20}
+def search_ludopedia_games(session, game_name, page=1):
+    """Search for a given game in Ludopedia, adding the results to the local catalog"""
+    params = {'tipo': 'jogo', 'count': 'true', 'pagina': page, 'qt_rows': LUDOPEDIA_SEARCH_ROWS}
     params['nm_jogo'] = game_name
-    game_request = session.get(LUDOPEDIA_SEARCH_URL, params=params)
-    data = game_request.json()['data']
+    if LUDOPEDIA_SEARCH_HEDGE_DELAY is None:
+        fetch = partial(session.get, LUDOPEDIA_SEARCH_URL, params=params)
+    else:
+        fetch = partial(hedged_get, session, LUDOPEDIA_SEARCH_URL, LUDOPEDIA_SEARCH_HEDGE_DELAY,
+                        params=params)
+    with TRACER.span('search_ludopedia_games', 'stage', game=game_name):
+        game_request = archived_get(fetch, LUDOPEDIA_SEARCH_URL, params)
+    data = game_request.json()['data'] or []
+    LUDOPEDIA_CATALOG.add(data, game_name if page == 1 else None)
     return data
 
+def find_ludopedia_game(session, game_name, year_published):
+    """Finds the Ludopedia game with the given name and year, looking it up in the local catalog
+    first and only searching Ludopedia on a miss. Returns the game found (or None) and the
+    search results, if a search was made"""
+    # A previous search for the same name also covers games whose Ludopedia name is translated
+    cached_items = LUDOPEDIA_CATALOG.find_search(game_name) or []
+    for item in chain(cached_items, LUDOPEDIA_CATALOG.find(game_name)):
+        if item['ano_publicacao'] == year_published:
+            return (item, [])
+
+    data = search_ludopedia_games(session, game_name)
+    for item in data:
+        if item['ano_publicacao'] == year_published:
+            return (item, data)
+    return (None, data)
+
+def get_games_to_warm(game_names):
+    """Returns the games that are not in the local catalog yet, if catalog warming is enabled"""
+    if CATALOG_WARM_PAGES <= 0:
+        return []
+    return [name for name in set(game_names)
+            if LUDOPEDIA_CATALOG.find_search(name) is None and not LUDOPEDIA_CATALOG.find(name)]
+
+def warm_catalog(session, game_name):
+    """Fills the local catalog with a few pages of search results for a game"""
+    for page in range(1, CATALOG_WARM_PAGES + 1):
+        if len(search_ludopedia_games(session, game_name, page)) < LUDOPEDIA_SEARCH_ROWS:
+            break
+
+class JobScheduler(QObject):
+    """Runs independent workers concurrently as jobs on a thread pool"""
+    idle = Signal()
+
+    def __init__(self, max_jobs, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_jobs)
+        self.workers = dict()
+
+    def submit(self, worker, group=None):
+        """Schedules a worker to run as soon as there is a free thread on the pool, optionally
+        as part of a group of jobs that can be cancelled together"""
+        self.workers[worker] = group
+        worker.done.connect(self.job_finished)
+        self.pool.start(WorkerJob(worker))
+
+    def job_finished(self, worker):
+        """Releases a worker once its job is done"""
+        self.workers.pop(worker, None)
+        if not self.workers:
+            self.idle.emit()
+
+    def cancel(self, group):
+        """Asks the running and queued workers of a group to stop"""
+        for worker, worker_group in list(self.workers.items()):
+            if worker_group == group:
+                worker.cancel()
+
+    def cancel_all(self):
+        """Asks all running and queued workers to stop"""
+        for worker in list(self.workers):
+            worker.cancel()
+
+class WorkerJob(QRunnable):
+    """Runnable that executes a worker on the job scheduler thread pool"""
+
+    def __init__(self, worker):
+        super().__init__()
+        self.worker = worker
+
+    def run(self):
+        """Runs the worker (Overriden)"""
+        self.worker.run()
+
 class GenericWorker(QObject):
-    """Generic worker thread object which can broadcast messages"""
+    """Generic worker job object which can broadcast messages"""
+    JOB_NAME = ''
     message = Signal(MessageType, str)
+    progress = Signal(object)
     exit_on_error = Signal()
+    done = Signal(object)
+
+    def __init__(self):
+        super().__init__()
+        self.cancelled = False
+        self.deadline = None
+        self.latencies = dict()
+        self.latencies_lock = Lock()
+        self.progress_lock = Lock()
+        self.stage = ''
+        self.stage_start = 0.0
+        self.items_done = 0
+        self.items_total = 0
+        self.last_progress = 0.0
 
     def run(self):
         """Base method to run and post exceptions as errors"""
+        TRACER.set_job(self.JOB_NAME)
         try:
-            self.run_impl()
+            self.check_cancelled()
+            with TRACER.span(self.JOB_NAME, 'job'):
+                self.run_impl()
+        except DeadlineExceeded:
+            self.post_error('Tempo limite da importação excedido')
+            self.exit_on_error.emit()
+        except JobCancelled:
+            self.post_generic('Cancelado')
+            self.exit_on_error.emit()
+        except BGGUnavailable as exc:
+            self.post_error(str(exc))
+            self.exit_on_error.emit()
         except InputError as exc:
             self.exit_on_error.emit()
             raise
@@ -623,21 +1424,137 @@ class GenericWorker(QObject):
             self.post_error(f'Thread exited with "{exc}"')
             self.exit_on_error.emit()
             raise
+        finally:
+            self.post_latencies()
+            self.done.emit(self)
+
+    def cancel(self):
+        """Asks the worker to stop before processing its next item"""
+        self.cancelled = True
+
+    def check_cancelled(self):
+        """Stops the worker if it was cancelled or its import ran past the deadline"""
+        if self.cancelled:
+            raise JobCancelled
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise DeadlineExceeded
+
+    def start_progress(self, stage, total):
+        """Starts reporting progress for a new stage with the given number of items"""
+        with self.progress_lock:
+            self.stage = stage
+            self.stage_start = time.monotonic()
+            self.items_done = 0
+            self.items_total = total
+        self.advance_progress(0)
+
+    def advance_progress(self, count=1):
+        """Marks items of the current stage as done, broadcasting the progress if it is due"""
+        with self.progress_lock:
+            self.items_done += count
+            now = time.monotonic()
+            if (now - self.last_progress < PROGRESS_INTERVAL and count and
+                    self.items_done < self.items_total):
+                return
+            self.last_progress = now
+            elapsed = now - self.stage_start
+            rate = self.items_done / elapsed if elapsed > 0 else 0.0
+            eta = (self.items_total - self.items_done) / rate if rate > 0 else None
+            progress = Progress(job=self.JOB_NAME, stage=self.stage, done=self.items_done,
+                                total=self.items_total, rate=rate, eta=eta)
+        self.progress.emit(progress)
+
+    @contextmanager
+    def timed_item(self, stage):
+        """Records how long processing an item of the given stage took"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            with self.latencies_lock:
+                self.latencies.setdefault(stage, LatencyStats()).add(time.monotonic() - start)
+
+    def post_latencies(self):
+        """Broadcast the time taken per item on each stage"""
+        for stage, latency_stats in self.latencies.items():
+            self.post_generic(f'Tempo por {stage}: {latency_stats.summary()}')
+
+    def post_message(self, message_type, text):
+        """Broadcast messages identified by the job name to anyone listening"""
+        self.message.emit(message_type, f'[{self.JOB_NAME}] {text}' if self.JOB_NAME else text)
 
     def post_debug(self, text):
         """Broadcast debug messages to anyone listening"""
-        self.message.emit(MessageType.DEBUG, text)
+        self.post_message(MessageType.DEBUG, text)
 
     def post_error(self, text):
         """Broadcast error messages to anyone listening"""
-        self.message.emit(MessageType.ERROR, text)
+        self.post_message(MessageType.ERROR, text)
 
     def post_generic(self, text):
         """Broadcast messages to anyone listening"""
-        self.message.emit(MessageType.GENERIC, text)
+        self.post_message(MessageType.GENERIC, text)
+
+class UserMapResolver(GenericWorker):
+    """Class that maps BGG users from usuarios.txt to their Ludopedia user ids"""
+    JOB_NAME = 'Usuários'
+    finished = Signal(object)
+
+    def __init__(self, bgg_user=None, ludo_user_id=None):
+        super().__init__()
+        self.bgg_user = bgg_user
+        self.ludo_user_id = ludo_user_id
+
+    def run_impl(self):
+        """Run user map resolver"""
+        user_map = self.get_bgg_to_ludo_users()
+        if self.bgg_user and self.bgg_user not in user_map:
+            user_map[self.bgg_user] = self.ludo_user_id
+        self.finished.emit(user_map)
+
+    def get_bgg_to_ludo_users(self):
+        """Reads usuarios.txt file to map a bgg user to its corresponding ludopedia one"""
+        try:
+            parser = ConfigParser()
+            with open("usuarios.txt") as lines:
+                lines = chain(("[top]",), lines)
+                parser.read_file(lines)
+                bgg_to_ludo_user = dict(parser['top'])
+                self.start_progress('Mapeando usuários', len(bgg_to_ludo_user))
+                bgg_to_ludo_user_id = dict()
+                for bgg_user, ludo_user in bgg_to_ludo_user.items():
+                    self.check_cancelled()
+                    with self.timed_item('usuário'):
+                        ludo_user_id = self.get_ludo_user_id_for(bgg_user, ludo_user)
+                    if ludo_user_id:
+                        bgg_to_ludo_user_id[bgg_user] = ludo_user_id
+                    self.advance_progress()
+                return bgg_to_ludo_user_id
+        except FileNotFoundError:
+            self.post_error('Não foi possível encontrar o arquivo "usuarios.txt"')
+            return {}
+
+    def get_ludo_user_id_for(self, bgg_user, ludo_user):
+        """Returns the ludopedia user id for an entry of the user map, or None if invalid"""
+        if is_invalid_bgg_user(bgg_user):
+            self.post_error(f'Usuário do BGG "{bgg_user}" inválido no mapa de usuários')
+            return None
+
+        if ludo_user.isdigit():
+            self.post_debug(f'Usuário do BGG "{bgg_user}" já mapeado'
+                            f' ao id ludopedia: {ludo_user}')
+            return ludo_user
+
+        ludo_user_id = get_ludo_user_id(ludo_user)
+        if ludo_user_id:
+            self.post_debug(f'{ludo_user_id} para {ludo_user}')
+        else:
+            self.post_error(f'Falha ao buscar id de usuario da ludopedia para "{ludo_user}"')
+        return ludo_user_id
 
 class BGGColectionFetcher(GenericWorker):
     """Class that fetches the game collection of a BGG user"""
+    JOB_NAME = 'Coleção BGG'
     finished = Signal(object)
 
     def __init__(self, bgg_user):
@@ -677,6 +1594,7 @@ class BGGColectionFetcher(GenericWorker):
 
 class BGGPlayFetcher(GenericWorker):
     """Class that retrieves all logged plays from a BGG user given a data range"""
+    JOB_NAME = 'Partidas BGG'
     finished = Signal(object)
 
     def __init__(self, bgg_user, min_date, max_date):
@@ -698,6 +1616,7 @@ class BGGPlayFetcher(GenericWorker):
         total_pages = 1
         plays = []
         while has_more:
+            self.check_cancelled()
             params = {
                 'username': username,
                 'page': page,
@@ -705,7 +1624,8 @@ class BGGPlayFetcher(GenericWorker):
                 'maxdate': datetime.strptime(max_date, '%d/%m/%Y').strftime('%Y-%m-%d')
             }
 
-            response = get_from_bgg(BGG_PLAYS_API, params)
+            with self.timed_item('página'), TRACER.span(f'página {page}', 'stage'):
+                response = get_from_bgg(BGG_PLAYS_API, params)
 
             if response.status_code == 200:
                 root = ElementTree.fromstring(response.content)
@@ -719,12 +1639,16 @@ class BGGPlayFetcher(GenericWorker):
                     if int(total_partidas) > 0:
                         total_pages = ceil(int(total_partidas)/BGG_PLAYS_PER_PAGE)
                         self.post_generic(f'Total de partidas encontradas no BGG: {total_partidas}')
+                        self.start_progress('Obtendo partidas do BGG', int(total_partidas))
                     else:
                         self.post_generic(f'Nenhuma partida encontrada no período selecionado')
                         raise InputError
                 self.post_generic(f'Obtendo partidas do BGG, página {page}/{total_pages}')
 
-                plays.extend(parse_play(play, username) for play in root.findall('play'))
+                with TRACER.span('parse_play', 'stage', page=page):
+                    page_plays = [parse_play(play, username) for play in root.findall('play')]
+                plays.extend(page_plays)
+                self.advance_progress(len(page_plays))
 
                 self.post_generic(f'Total de partidas importadas: {len(plays)}')
 
@@ -737,6 +1661,7 @@ class BGGPlayFetcher(GenericWorker):
 
 class LudopediaCollectionLogger(GenericWorker):
     """Class that logs a collection of BGG games into Ludopedia"""
+    JOB_NAME = 'Coleção Ludopedia'
     finished = Signal()
 
     def __init__(self, session, collection):
@@ -752,32 +1677,60 @@ class LudopediaCollectionLogger(GenericWorker):
     def import_collection(self, session, collection):
         """Imports a given collection into Ludopedia"""
         self.post_generic('Importando coleção...')
-
-        for bgg_game in collection:
-            data = search_ludopedia_games(session, bgg_game[0])
-
-            if data:
-                for item in data:
-                    year_published = bgg_game[2]
-
-                    if item['ano_publicacao'] == year_published:
-                        id_jogo = item['id_jogo']
-                        own = bgg_game[1]['own']
-                        wishlist = bgg_game[1]['wishlist']
+        games_to_warm = get_games_to_warm([bgg_game[0] for bgg_game in collection])
+        if games_to_warm:
+            self.post_generic(f'Atualizando catálogo local com {len(games_to_warm)} jogos...')
+        for game_name in games_to_warm:
+            self.check_cancelled()
+            warm_catalog(session, game_name)
+        self.start_progress('Importando coleção', len(collection))
+
+        # Games are searched one by one, but posted in parallel by the sessions in the pool
+        added_games = []
+        try:
+            with ThreadPoolExecutor(max_workers=session.size, initializer=TRACER.set_job,
+                                    initargs=(self.JOB_NAME,)) as executor:
+                for bgg_game in collection:
+                    self.check_cancelled()
+                    with self.timed_item('busca'):
+                        (item, _) = find_ludopedia_game(session, bgg_game[0], bgg_game[2])
+
+                    if item:
                         payload_add_game = {
-                            'id_jogo': id_jogo,
-                            'fl_tem': own,
-                            'fl_quer': wishlist
+                            'id_jogo': item['id_jogo'],
+                            'fl_tem': bgg_game[1]['own'],
+                            'fl_quer': bgg_game[1]['wishlist']
                         }
-                        session.post(LUDOPEDIA_ADD_GAME_URL, data=payload_add_game)
-                        break
+                        added_games.append(executor.submit(self.add_game, session,
+                                                           payload_add_game))
+                    self.advance_progress()
+            self.check_cancelled()
+        finally:
+            added = sum(added_game.result() for added_game in added_games
+                        if not added_game.exception())
+            self.post_generic(f'{added}/{len(collection)} jogos adicionados à coleção')
+        for added_game in added_games:
+            added_game.result()
         self.post_generic('Coleção Importada!')
 
+    def add_game(self, session, payload_add_game):
+        """Adds a game to the Ludopedia collection and returns how many games were added"""
+        if self.cancelled:
+            return 0
+
+        if is_replaying():
+            self.post_debug(f'Jogo {payload_add_game["id_jogo"]} não enviado (arquivo HTTP)')
+            return 1
+
+        with self.timed_item('envio'), TRACER.span('jogo_usuario_ajax', 'stage'):
+            session.post(LUDOPEDIA_ADD_GAME_URL, data=payload_add_game, stream=True).close()
+        return 1
+
 class LudopediaPlayLogger(GenericWorker):
     """Class that logs a series of BGG plays into Ludopedia"""
+    JOB_NAME = 'Partidas Ludopedia'
     finished = Signal()
-    request_search = Signal(object, object)
-    request_alternative = Signal(object, object)
+    request_resolutions = Signal(object, object)
 
     def __init__(self, session, plays, my_bgg_user, user_map):
         super().__init__()
@@ -785,98 +1738,173 @@ class LudopediaPlayLogger(GenericWorker):
         self.plays = plays
         self.my_bgg_user = my_bgg_user
         self.user_map = user_map
-        self.alternative = None
+        self.resolutions = dict()
 
     def run_impl(self):
         """Run Play Logger"""
         self.import_plays(self.plays)
         self.finished.emit()
 
-    def receive_alternative(self, alternative):
-        """Receives alternative game chosen by user to use for logging"""
-        self.alternative = alternative
+    def receive_resolutions(self, resolutions):
+        """Receives games chosen by user to use for logging, keyed by BGG game name"""
+        self.resolutions = resolutions
 
-    def clear_alternative(self):
-        """Clear alternative"""
-        self.alternative = None
+    def get_ludopedia_match_for_game(self, bgg_play, mapped_games, pending_games):
+        """Gets the corresponding ludopedia game for a given BGG game
 
-    def get_ludopedia_match_for_game(self, bgg_play, mapped_games):
-        """Gets the corresponding ludopedia game for a given BGG game"""
+        Games that can't be matched automatically are parked in pending_games, together with
+        the search results, to be resolved by the user once all other plays are posted.
+        """
         if bgg_play.game_name in mapped_games:
             self.post_debug(f'Cache-mapped: {bgg_play.game_name}')
             return mapped_games[bgg_play.game_name]
 
-        data = search_ludopedia_games(self.session, bgg_play.game_name)
-        if data:
-            for item in data:
-                if item['ano_publicacao'] == bgg_play.year_published:
-                    mapped_games[bgg_play.game_name] = item
-                    self.post_debug(f'Auto-mapped: {bgg_play.game_name}')
-                    return item
-
-            self.request_alternative.emit(bgg_play, data)
-            chosen_option = self.alternative
-            self.clear_alternative()
-            if chosen_option:
-                mapped_games[bgg_play.game_name] = chosen_option
-                self.post_debug(f'Manually-mapped: {bgg_play.game_name}')
-                return chosen_option
-            self.post_debug(f'Automatically mapping {bgg_play.game_name} to {data[0]}')
-            return data[0]
-
-        self.request_search.emit(self.session, bgg_play)
-        data = self.alternative
-        self.clear_alternative()
-        if data:
-            mapped_games[bgg_play.game_name] = data
-            self.post_debug(f'Manually-mapped: {bgg_play.game_name}')
-        return data
+        if bgg_play.game_name in pending_games:
+            return None
+
+        (item, data) = find_ludopedia_game(self.session, bgg_play.game_name,
+                                           bgg_play.year_published)
+        if item:
+            mapped_games[bgg_play.game_name] = item
+            self.post_debug(f'Auto-mapped: {bgg_play.game_name}')
+            return item
+
+        pending_games[bgg_play.game_name] = (bgg_play, data)
+        self.post_debug(f'Deferred: {bgg_play.game_name}')
+        return None
+
+    def resolve_pending_games(self, pending_games):
+        """Asks the user, in a single batch, to resolve all pending games"""
+        self.post_generic(f'{len(pending_games)} jogos aguardando escolha manual')
+        with TRACER.span('request_resolutions', 'wait', games=len(pending_games)):
+            self.request_resolutions.emit(self.session, list(pending_games.values()))
+        resolutions = self.resolutions
+        self.resolutions = dict()
+        mapped_games = dict()
+        for game_name, item in resolutions.items():
+            if item:
+                mapped_games[game_name] = item
+                self.post_debug(f'Manually-mapped: {game_name}')
+        return mapped_games
 
     def import_plays(self, plays):
         """Import all logged plays into Ludopedia"""
         self.post_generic('Importando partidas...')
 
         mapped_games = dict()
-        imported_plays = 0
-
-        for bgg_play in plays:
-            found = self.get_ludopedia_match_for_game(bgg_play, mapped_games)
-            if found:
-                id_jogo = found['id_jogo']
-
-                players = bgg_play.players
-                payload_add_play = {
-                    'id_jogo': id_jogo,
-                    'dt_partida': datetime.strptime(bgg_play.date, '%Y-%m-%d').strftime('%d/%m/%Y'),
-                    'qt_partidas': 1,
-                    'duracao_h': int(int(bgg_play.length)/60),
-                    'duracao_m': int(bgg_play.length)%60,
-                    'descricao': bgg_play.comments,
-
-                    # (name, bgguser, startposition, score, win)
-                    'id_partida_jogador[]': self.get_id_partida_jogador(players),
-                    'id_usuario[]': map(lambda p: get_id_usuario(p, self.user_map), players),
-                    'nome[]': map(lambda p: p.name, players),
-                    'fl_vencedor[]': map(lambda p: p.win, players),
-                    'vl_pontos[]': map(lambda p: p.score, players),
-                    'observacao[]': map(get_observacao_jogador, players)
-                }
-                result = self.session.post(LUDOPEDIA_ADD_PLAY_URL, data=payload_add_play)
-                match_id = re.search(LUDOPEDIA_VIEW_PLAY_REGEX, result.text)
-                if match_id:
-                    imported_plays += 1
-                else:
-                    self.post_error(f'Erro ao postar partida #{bgg_play.id}'
-                                    f' de {bgg_play.game_name}')
-
-            else:
-                self.post_error(f'Jogo não encontrado na Ludopedia: {bgg_play.game_name}')
-
-        self.post_generic(f'{imported_plays}/{len(plays)} partidas importadas!')
-
-    def get_id_partida_jogador(self, players):
-        """Get id_partida for every player on a play"""
-        return map(lambda p: 0 if self.my_bgg_user.lower() == p.bgg_user.lower() else '', players)
+        pending_games = dict()
+        deferred_groups = []
+        posts = []
+        play_groups = coalesce_plays(plays)
+        games_to_warm = get_games_to_warm([group.play.game_name for group in play_groups])
+        if games_to_warm:
+            self.post_generic(f'Atualizando catálogo local com {len(games_to_warm)} jogos...')
+        for game_name in games_to_warm:
+            self.check_cancelled()
+            warm_catalog(self.session, game_name)
+        total_plays = sum(group.quantity for group in play_groups)
+        self.post_debug(f'{len(plays)} partidas agrupadas em {len(play_groups)} envios')
+        self.start_progress('Importando partidas', total_plays)
+
+        # Games are matched one by one, but plays are posted in parallel by the sessions in the pool
+        try:
+            with ThreadPoolExecutor(max_workers=self.session.size, initializer=TRACER.set_job,
+                                    initargs=(self.JOB_NAME,)) as executor:
+                for play_group in play_groups:
+                    self.check_cancelled()
+                    with self.timed_item('busca'):
+                        found = self.get_ludopedia_match_for_game(play_group.play, mapped_games,
+                                                                  pending_games)
+                    if found:
+                        posts.append(self.submit_post(executor, play_group, found))
+                    else:
+                        deferred_groups.append(play_group)
+
+                if deferred_groups:
+                    mapped_games.update(self.resolve_pending_games(pending_games))
+                    for play_group in deferred_groups:
+                        self.check_cancelled()
+                        found = mapped_games.get(play_group.play.game_name)
+                        if found:
+                            posts.append(self.submit_post(executor, play_group, found))
+                        else:
+                            self.post_error(f'Jogo não encontrado na Ludopedia:'
+                                            f' {play_group.play.game_name}'
+                                            f' (partida {format_play_ids(play_group)})')
+                            self.advance_progress(play_group.quantity)
+            self.check_cancelled()
+        finally:
+            # Also reached when cancelled, to report what was imported up to that point
+            imported_plays = sum(post.result() for post in posts if not post.exception())
+            self.post_generic(f'{imported_plays}/{total_plays} partidas importadas!')
+        for post in posts:
+            post.result()
+
+    def submit_post(self, executor, play_group, ludopedia_game):
+        """Schedules a group of plays to be posted, advancing the progress once it is done"""
+        post = executor.submit(self.post_play_group, play_group, ludopedia_game)
+        post.add_done_callback(lambda _: self.advance_progress(play_group.quantity))
+        return post
+
+    def post_play_group(self, play_group, ludopedia_game):
+        """Posts a group of identical plays and returns how many plays were imported"""
+        if self.cancelled:
+            return 0
+
+        bgg_play = play_group.play
+        payload_add_play = build_play_payload(play_group, ludopedia_game, self.my_bgg_user,
+                                              self.user_map)
+        if is_replaying():
+            self.post_debug(f'Partida {format_play_ids(play_group)} de {bgg_play.game_name}'
+                            f' mapeada para {ludopedia_game["id_jogo"]} e não enviada'
+                            f' (arquivo HTTP)')
+            return play_group.quantity
+
+        with self.timed_item('envio'), TRACER.span('cadastra_partida', 'stage',
+                                                   plays=play_group.play_ids):
+            result = self.session.post(LUDOPEDIA_ADD_PLAY_URL, data=payload_add_play,
+                                       allow_redirects=False, stream=True)
+            match_id = search_response(result, LUDOPEDIA_VIEW_PLAY_REGEX, self.session)
+        if match_id:
+            # Merged posts are always reported, as the log is the only link to their BGG plays
+            merged = play_group.quantity > 1 or len(play_group.play_ids) > 1
+            self.post_message(MessageType.GENERIC if merged else MessageType.DEBUG,
+                              f'Partida Ludopedia #{match_id.group(1).decode()} criada a partir'
+                              f' de {format_play_ids(play_group)} ({play_group.quantity}x)')
+            return play_group.quantity
+
+        self.post_error(f'Erro ao postar partida {format_play_ids(play_group)}'
+                        f' de {bgg_play.game_name}')
+        return 0
+
+def build_play_payload(play_group, ludopedia_game, my_bgg_user, user_map):
+    """Builds the form data to post a group of identical plays to Ludopedia"""
+    bgg_play = play_group.play
+    players = bgg_play.players
+    return {
+        'id_jogo': ludopedia_game['id_jogo'],
+        'dt_partida': datetime.strptime(bgg_play.date, '%Y-%m-%d').strftime('%d/%m/%Y'),
+        'qt_partidas': play_group.quantity,
+        'duracao_h': int(int(bgg_play.length)/60),
+        'duracao_m': int(bgg_play.length)%60,
+        'descricao': bgg_play.comments,
+
+        # (name, bgguser, startposition, score, win)
+        'id_partida_jogador[]': get_id_partida_jogador(players, my_bgg_user),
+        'id_usuario[]': [get_id_usuario(p, user_map) for p in players],
+        'nome[]': [p.name for p in players],
+        'fl_vencedor[]': [p.win for p in players],
+        'vl_pontos[]': [p.score for p in players],
+        'observacao[]': [get_observacao_jogador(p) for p in players]
+    }
+
+def get_id_partida_jogador(players, my_bgg_user):
+    """Get id_partida for every player on a play"""
+    return [0 if my_bgg_user.lower() == p.bgg_user.lower() else '' for p in players]
+
+def format_play_ids(play_group):
+    """Formats the BGG play ids of a play group for logging"""
+    return ', '.join(f'#{play_id}' for play_id in play_group.play_ids)
 
 def get_id_usuario(player, ludo_users):
     """Get id_usuario for each player on a play"""
@@ -0,0 +1,123 @@
+"""
+Tests for the play grouping, Ludopedia response search and local game catalog of the importer
+"""
+
+import io
+import os
+import sys
+from unittest import mock
+from xml.etree import ElementTree
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import importador  # pylint: disable=wrong-import-position
+
+USER_PAGE_URL = f'{importador.LUDOPEDIA_USER_URL}jogador'
+
+def create_response(body, url=USER_PAGE_URL):
+    """Creates a streamed response with the given body"""
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response.raw = io.BytesIO(body)
+    return response
+
+def test_search_response_id_split_between_chunks():
+    """An id cut by a chunk boundary is returned whole"""
+    link = f'<a href="{importador.LUDOPEDIA_PLAYS_URL}123456">Partidas</a>'.encode()
+    prefix = b'x' * (importador.STREAM_CHUNK_SIZE - link.index(b'3456'))
+    match = importador.search_response(create_response(prefix + link),
+                                       importador.LUDOPEDIA_USER_ID_REGEX)
+    assert match.group(1) == b'123456'
+
+def test_search_response_id_at_end_of_body():
+    """An id ending the body is found once the stream ends"""
+    body = f'{importador.LUDOPEDIA_PLAYS_URL}42'.encode()
+    match = importador.search_response(create_response(body), importador.LUDOPEDIA_USER_ID_REGEX)
+    assert match.group(1) == b'42'
+
+def test_search_response_replayed_from_archive(tmp_path):
+    """Responses rebuilt from the HTTP archive can be searched"""
+    archive = importador.HttpArchive(str(tmp_path / 'arquivo.sqlite'))
+    body = f'<a href="{importador.LUDOPEDIA_PLAYS_URL}7">Partidas</a>'.encode()
+    response = requests.Response()
+    response.status_code = 200
+    response.url = USER_PAGE_URL
+    response._content = body  # pylint: disable=protected-access
+    archive.save(USER_PAGE_URL, response)
+
+    match = importador.search_response(archive.load(USER_PAGE_URL),
+                                       importador.LUDOPEDIA_USER_ID_REGEX)
+    assert match.group(1) == b'7'
+
+def test_find_ludopedia_game_repeated_search_served_locally(tmp_path, monkeypatch):
+    """A repeated search for a translated name is served from the catalog"""
+    monkeypatch.setattr(importador, 'LUDOPEDIA_CATALOG',
+                        importador.LudopediaCatalog(str(tmp_path / 'catalogo.sqlite')))
+    monkeypatch.setattr(importador, 'LUDOPEDIA_SEARCH_HEDGE_DELAY', None)
+    game = {'id_jogo': '5', 'nm_jogo': 'Terra Mística', 'ano_publicacao': '2012'}
+    session = mock.Mock()
+    session.get.return_value.json.return_value = {'data': [game]}
+
+    for _ in range(2):
+        (item, _) = importador.find_ludopedia_game(session, 'Terra Mystica', '2012')
+        assert item == game
+    assert session.get.call_count == 1
+
+def create_play_element(play_id, quantity='1', location='Casa', comments=None, score='10'):
+    """Creates a BGG play element with a single player"""
+    play = ElementTree.Element('play', id=str(play_id), date='2020-01-01', length='60',
+                               location=location)
+    if quantity is not None:
+        play.set('quantity', quantity)
+    ElementTree.SubElement(play, 'item', name='Jogo', objectid='1')
+    if comments is not None:
+        ElementTree.SubElement(play, 'comments').text = comments
+    players = ElementTree.SubElement(play, 'players')
+    ElementTree.SubElement(players, 'player', username='eu', name='Eu', startposition='1',
+                           color='', score=score, new='0', win='1')
+    return play
+
+def parse_plays(*play_elements):
+    """Parses play elements without requesting the year published to BGG"""
+    importador.BGG_GAME_TO_PUBLISHED_YEAR.setdefault('1', '2000')
+    return [importador.parse_play(play, 'eu') for play in play_elements]
+
+def test_parse_play_quantity_defaults_to_one():
+    """Plays without a quantity in the XML count as a single play"""
+    (play,) = parse_plays(create_play_element(1, quantity=None))
+    assert play.quantity == 1
+
+def test_coalesce_plays_merges_identical_plays():
+    """Identical plays are posted once with the sum of their quantities"""
+    plays = parse_plays(create_play_element(1, quantity='2'), create_play_element(2))
+    (group,) = importador.coalesce_plays(plays)
+    assert group.quantity == 3
+    assert group.play_ids == ['1', '2']
+
+def test_coalesce_plays_keeps_different_plays_apart():
+    """Plays differing in location, comments or player results are posted separately"""
+    plays = parse_plays(create_play_element(1), create_play_element(2, location='Clube'),
+                        create_play_element(3, comments='Revanche'),
+                        create_play_element(4, score='20'))
+    groups = importador.coalesce_plays(plays)
+    assert [group.play_ids for group in groups] == [['1'], ['2'], ['3'], ['4']]
+    assert all(group.quantity == 1 for group in groups)
+
+def test_find_ludopedia_game_cached_search_without_year_searched_again(tmp_path, monkeypatch):
+    """A previous search without the wanted edition is searched again, updating the catalog"""
+    monkeypatch.setattr(importador, 'LUDOPEDIA_CATALOG',
+                        importador.LudopediaCatalog(str(tmp_path / 'catalogo.sqlite')))
+    monkeypatch.setattr(importador, 'LUDOPEDIA_SEARCH_HEDGE_DELAY', None)
+    old_edition = {'id_jogo': '5', 'nm_jogo': 'Terra Mística', 'ano_publicacao': '2012'}
+    new_edition = {'id_jogo': '6', 'nm_jogo': 'Terra Mística Big Box', 'ano_publicacao': '2024'}
+    session = mock.Mock()
+    session.get.return_value.json.side_effect = [{'data': [old_edition]},
+                                                 {'data': [old_edition, new_edition]}]
+
+    (item, _) = importador.find_ludopedia_game(session, 'Terra Mystica', '2024')
+    assert item is None
+    (item, _) = importador.find_ludopedia_game(session, 'Terra Mystica', '2024')
+    assert item == new_edition
+    assert importador.LUDOPEDIA_CATALOG.find_search('Terra Mystica') == [old_edition, new_edition]